@@ -1,24 +1,26 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from typing import List
-import uuid
-import time
+import asyncio
 import logging
 from .models import (
     CreateOfferRequest, AcceptOfferRequest, LockFundsRequest, ClaimFundsRequest,
     SwapOfferResponse, SwapStatus, SwapRole
 )
+from .dependencies import get_storage, get_htlc_pool
 from htlc import HTLCEngine
 from db import SwapStorage
-from wallets import BitcoinWallet, DepixWallet
+from wallets import BitcoinWallet, DepixWallet, to_sats
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/atomic", tags=["Atomic Swaps"])
 
 # Global instances
-storage = SwapStorage()
 htlc_engine = HTLCEngine()
 
+# Number of ready-made (secret, hashlock) pairs kept by refill_htlc_pool()
+HTLC_POOL_SIZE = 64
+
 # Wallet instances (set from main.py)
 bitcoin_wallet: BitcoinWallet = None
 depix_wallet: DepixWallet = None
@@ -28,8 +30,25 @@ def set_wallets(btc_wallet: BitcoinWallet, dpx_wallet: DepixWallet):
     bitcoin_wallet = btc_wallet
     depix_wallet = dpx_wallet
 
+async def _transition_rejected(storage: SwapStorage, swap_id: str, detail: str) -> HTTPException:
+    """Build the error for a status transition that matched no offer"""
+    offer = await asyncio.to_thread(storage.get_offer_public, swap_id)
+    if not offer:
+        return HTTPException(status_code=404, detail="Offer not found")
+    return HTTPException(status_code=400, detail=f"{detail} (status: {offer['status']})")
+
+async def refill_htlc_pool(pool: asyncio.Queue):
+    """Keep the HTLC parameter pool topped up (runs for the app lifetime)"""
+    while True:
+        secret = htlc_engine.generate_secret()
+        await pool.put((secret, htlc_engine.create_hashlock(secret)))
+
 @router.post("/offers", response_model=SwapOfferResponse)
-async def create_offer(request: CreateOfferRequest):
+async def create_offer(
+    request: CreateOfferRequest,
+    storage: SwapStorage = Depends(get_storage),
+    htlc_pool: asyncio.Queue = Depends(get_htlc_pool)
+):
     """
     Step 1: Alice creates a swap offer
     
@@ -39,15 +58,18 @@ async def create_offer(request: CreateOfferRequest):
     - Her receiving address
     """
     try:
-        # Generate HTLC parameters
-        secret = htlc_engine.generate_secret()
-        hashlock = htlc_engine.create_hashlock(secret)
+        # Take pre-generated HTLC parameters, generating inline if the pool is empty
+        try:
+            secret, hashlock = htlc_pool.get_nowait()
+        except asyncio.QueueEmpty:
+            secret = htlc_engine.generate_secret()
+            hashlock = htlc_engine.create_hashlock(secret)
         
         # Initiator locks for 24 hours, acceptor for 12 hours
         initiator_timelock = htlc_engine.create_timelock(hours=24)
         acceptor_timelock = htlc_engine.create_timelock(hours=12)
         
-        swap_id = str(uuid.uuid4())
+        swap_id = htlc_engine.generate_swap_id()
         
         offer_data = {
             "swap_id": swap_id,
@@ -61,89 +83,71 @@ async def create_offer(request: CreateOfferRequest):
             "secret": secret.hex(),  # Store secret for initiator
             "initiator_timelock": initiator_timelock,
             "acceptor_timelock": acceptor_timelock,
-            "created_at": int(time.time())
+            "created_at": htlc_engine.now()
         }
         
-        storage.create_offer(offer_data)
+        await asyncio.to_thread(storage.create_offer, offer_data)
         
         logger.info(f"Created swap offer: {swap_id}")
         
-        return SwapOfferResponse(**{k: v for k, v in offer_data.items() if k != 'secret'})
+        return SwapOfferResponse.model_construct(**offer_data)
     
     except Exception as e:
         logger.error(f"Failed to create offer: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/offers", response_model=List[SwapOfferResponse])
-async def list_offers(status: str = None):
+async def list_offers(status: str = None, storage: SwapStorage = Depends(get_storage)):
     """
     List swap offers
     
     Query params:
     - status: Filter by status (offered, accepted, etc.)
     """
-    try:
-        if status:
-            offers = storage.get_all_offers(status=status)
-        else:
-            offers = storage.get_all_offers()
-        
-        return [SwapOfferResponse(**{k: v for k, v in offer.items() if k != 'secret'}) 
-                for offer in offers]
+    if status:
+        offers = await asyncio.to_thread(storage.get_all_offers_public, status=status)
+    else:
+        offers = await asyncio.to_thread(storage.get_all_offers_public)
     
-    except Exception as e:
-        logger.error(f"Failed to list offers: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    return [SwapOfferResponse.model_construct(**offer) for offer in offers]
 
 @router.get("/offers/open", response_model=List[SwapOfferResponse])
-async def list_open_offers():
+async def list_open_offers(storage: SwapStorage = Depends(get_storage)):
     """
     List offers that can be accepted (status = offered)
     """
-    try:
-        offers = storage.get_open_offers()
-        return [SwapOfferResponse(**{k: v for k, v in offer.items() if k != 'secret'}) 
-                for offer in offers]
-    
-    except Exception as e:
-        logger.error(f"Failed to list open offers: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    offers = await asyncio.to_thread(storage.get_open_offers)
+    return [SwapOfferResponse.model_construct(**offer) for offer in offers]
 
 @router.get("/offers/{swap_id}", response_model=SwapOfferResponse)
-async def get_offer(swap_id: str):
+async def get_offer(swap_id: str, storage: SwapStorage = Depends(get_storage)):
     """Get specific swap offer"""
-    offer = storage.get_offer(swap_id)
+    offer = await asyncio.to_thread(storage.get_offer_public, swap_id)
     if not offer:
         raise HTTPException(status_code=404, detail="Offer not found")
     
-    return SwapOfferResponse(**{k: v for k, v in offer.items() if k != 'secret'})
+    return SwapOfferResponse.model_construct(**offer)
 
 @router.post("/offers/{swap_id}/accept", response_model=SwapOfferResponse)
-async def accept_offer(swap_id: str, request: AcceptOfferRequest):
+async def accept_offer(swap_id: str, request: AcceptOfferRequest, storage: SwapStorage = Depends(get_storage)):
     """
     Step 2: Bob accepts a swap offer
     
     Bob provides his receiving address and commits to the swap
     """
     try:
-        offer = storage.get_offer(swap_id)
-        if not offer:
-            raise HTTPException(status_code=404, detail="Offer not found")
-        
-        if offer["status"] != SwapStatus.OFFERED.value:
-            raise HTTPException(status_code=400, detail=f"Offer cannot be accepted (status: {offer['status']})")
-        
-        # Update offer with acceptor info
-        storage.update_offer(swap_id, {
+        # Update offer with acceptor info, only if it is still open
+        updated_offer = await asyncio.to_thread(storage.transition, swap_id, SwapStatus.OFFERED.value, {
             "status": SwapStatus.ACCEPTED.value,
             "acceptor_address": request.acceptor_address,
-            "accepted_at": int(time.time())
+            "accepted_at": htlc_engine.now()
         })
+        if not updated_offer:
+            raise await _transition_rejected(storage, swap_id, "Offer cannot be accepted")
         
         logger.info(f"Offer accepted: {swap_id}")
         
-        updated_offer = storage.get_offer(swap_id)
-        return SwapOfferResponse(**{k: v for k, v in updated_offer.items() if k != 'secret'})
+        return SwapOfferResponse.model_construct(**updated_offer)
     
     except HTTPException:
         raise
@@ -152,14 +156,14 @@ async def accept_offer(swap_id: str, request: AcceptOfferRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/offers/{swap_id}/lock-initiator", response_model=SwapOfferResponse)
-async def lock_initiator_funds(swap_id: str):
+async def lock_initiator_funds(swap_id: str, storage: SwapStorage = Depends(get_storage)):
     """
     Step 3: Alice locks her funds (INITIATOR LOCKS FIRST)
     
     Alice creates HTLC with her asset (BTC or Depix)
     """
     try:
-        offer = storage.get_offer(swap_id)
+        offer = await asyncio.to_thread(storage.get_offer_public, swap_id)
         if not offer:
             raise HTTPException(status_code=404, detail="Offer not found")
         
@@ -168,29 +172,31 @@ async def lock_initiator_funds(swap_id: str):
         
         # Alice locks her asset
         asset = offer["initiator_asset"]
-        amount = offer["initiator_amount"]
+        amount_sats = to_sats(offer["initiator_amount"])
         recipient = offer["acceptor_address"]
         hashlock = offer["hashlock"]
         timelock = offer["initiator_timelock"]
         
         if asset == "btc":
-            result = await bitcoin_wallet.create_htlc(amount, hashlock, timelock, recipient)
+            result = await bitcoin_wallet.create_htlc(amount_sats, hashlock, timelock, recipient)
             txid = result["txid"]
         elif asset == "depix":
-            result = await depix_wallet.create_htlc(amount, hashlock, timelock, recipient)
+            result = await depix_wallet.create_htlc(amount_sats, hashlock, timelock, recipient)
             txid = result["txid"]
         else:
             raise HTTPException(status_code=400, detail=f"Unknown asset: {asset}")
         
-        storage.update_offer(swap_id, {
+        updated_offer = await asyncio.to_thread(storage.transition, swap_id, SwapStatus.ACCEPTED.value, {
             "status": SwapStatus.INITIATOR_LOCKED.value,
             "initiator_txid": txid
         })
+        if not updated_offer:
+            logger.error(f"Offer {swap_id} changed while locking, initiator txid {txid} not recorded")
+            raise await _transition_rejected(storage, swap_id, f"Offer changed while locking funds (txid: {txid})")
         
         logger.info(f"Initiator locked funds: {swap_id}, txid: {txid}")
         
-        updated_offer = storage.get_offer(swap_id)
-        return SwapOfferResponse(**{k: v for k, v in updated_offer.items() if k != 'secret'})
+        return SwapOfferResponse.model_construct(**updated_offer)
     
     except HTTPException:
         raise
@@ -199,14 +205,14 @@ async def lock_initiator_funds(swap_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/offers/{swap_id}/lock-acceptor", response_model=SwapOfferResponse)
-async def lock_acceptor_funds(swap_id: str):
+async def lock_acceptor_funds(swap_id: str, storage: SwapStorage = Depends(get_storage)):
     """
     Step 4: Bob locks his funds (ACCEPTOR LOCKS SECOND)
     
     Bob verifies Alice's HTLC and creates his own
     """
     try:
-        offer = storage.get_offer(swap_id)
+        offer = await asyncio.to_thread(storage.get_offer_public, swap_id)
         if not offer:
             raise HTTPException(status_code=404, detail="Offer not found")
         
@@ -215,29 +221,31 @@ async def lock_acceptor_funds(swap_id: str):
         
         # Bob locks his asset
         asset = offer["acceptor_asset"]
-        amount = offer["acceptor_amount"]
+        amount_sats = to_sats(offer["acceptor_amount"])
         recipient = offer["initiator_address"]
         hashlock = offer["hashlock"]
         timelock = offer["acceptor_timelock"]
         
         if asset == "btc":
-            result = await bitcoin_wallet.create_htlc(amount, hashlock, timelock, recipient)
+            result = await bitcoin_wallet.create_htlc(amount_sats, hashlock, timelock, recipient)
             txid = result["txid"]
         elif asset == "depix":
-            result = await depix_wallet.create_htlc(amount, hashlock, timelock, recipient)
+            result = await depix_wallet.create_htlc(amount_sats, hashlock, timelock, recipient)
             txid = result["txid"]
         else:
             raise HTTPException(status_code=400, detail=f"Unknown asset: {asset}")
         
-        storage.update_offer(swap_id, {
+        updated_offer = await asyncio.to_thread(storage.transition, swap_id, SwapStatus.INITIATOR_LOCKED.value, {
             "status": SwapStatus.ACCEPTOR_LOCKED.value,
             "acceptor_txid": txid
         })
+        if not updated_offer:
+            logger.error(f"Offer {swap_id} changed while locking, acceptor txid {txid} not recorded")
+            raise await _transition_rejected(storage, swap_id, f"Offer changed while locking funds (txid: {txid})")
         
         logger.info(f"Acceptor locked funds: {swap_id}, txid: {txid}")
         
-        updated_offer = storage.get_offer(swap_id)
-        return SwapOfferResponse(**{k: v for k, v in updated_offer.items() if k != 'secret'})
+        return SwapOfferResponse.model_construct(**updated_offer)
     
     except HTTPException:
         raise
@@ -246,7 +254,7 @@ async def lock_acceptor_funds(swap_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/offers/{swap_id}/claim-initiator")
-async def claim_initiator(swap_id: str):
+async def claim_initiator(swap_id: str, storage: SwapStorage = Depends(get_storage)):
     """
     Step 5: Alice claims Bob's funds (REVEALS SECRET)
     
@@ -254,23 +262,17 @@ async def claim_initiator(swap_id: str):
     Secret becomes public on blockchain
     """
     try:
-        offer = storage.get_offer(swap_id)
-        if not offer:
-            raise HTTPException(status_code=404, detail="Offer not found")
-        
-        if offer["status"] != SwapStatus.ACCEPTOR_LOCKED.value:
-            raise HTTPException(status_code=400, detail=f"Both parties must lock first (status: {offer['status']})")
-        
-        # Alice claims with her secret
-        secret = offer["secret"]
-        acceptor_txid = offer["acceptor_txid"]
-        
         # In production, this would broadcast a transaction with the secret
         # For PoC, we just mark as claimed
         
-        storage.update_offer(swap_id, {
+        offer = await asyncio.to_thread(storage.transition, swap_id, SwapStatus.ACCEPTOR_LOCKED.value, {
             "status": SwapStatus.INITIATOR_CLAIMED.value
-        })
+        }, with_secret=True)
+        if not offer:
+            raise await _transition_rejected(storage, swap_id, "Both parties must lock first")
+        
+        # Alice claims with her secret
+        secret = offer["secret"]
         
         logger.info(f"Initiator claimed funds: {swap_id}, secret revealed")
         
@@ -288,7 +290,7 @@ async def claim_initiator(swap_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/offers/{swap_id}/claim-acceptor")
-async def claim_acceptor(swap_id: str):
+async def claim_acceptor(swap_id: str, storage: SwapStorage = Depends(get_storage)):
     """
     Step 6: Bob claims Alice's funds (USES REVEALED SECRET)
     
@@ -296,24 +298,15 @@ async def claim_acceptor(swap_id: str):
     SWAP COMPLETE!
     """
     try:
-        offer = storage.get_offer(swap_id)
-        if not offer:
-            raise HTTPException(status_code=404, detail="Offer not found")
-        
-        if offer["status"] != SwapStatus.INITIATOR_CLAIMED.value:
-            raise HTTPException(status_code=400, detail=f"Initiator must claim first (status: {offer['status']})")
-        
-        # Bob uses the revealed secret
-        secret = offer["secret"]
-        initiator_txid = offer["initiator_txid"]
-        
         # In production, Bob would extract secret from blockchain
         # and use it to claim Alice's HTLC
         
-        storage.update_offer(swap_id, {
+        offer = await asyncio.to_thread(storage.transition, swap_id, SwapStatus.INITIATOR_CLAIMED.value, {
             "status": SwapStatus.COMPLETED.value,
-            "completed_at": int(time.time())
+            "completed_at": htlc_engine.now()
         })
+        if not offer:
+            raise await _transition_rejected(storage, swap_id, "Initiator must claim first")
         
         logger.info(f"Acceptor claimed funds: {swap_id}. SWAP COMPLETE!")
         
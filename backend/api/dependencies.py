@@ -0,0 +1,11 @@
+import asyncio
+from fastapi import Request
+from db import SwapStorage
+
+def get_storage(request: Request) -> SwapStorage:
+    """Get the process-wide storage opened in the app lifespan"""
+    return request.app.state.storage
+
+def get_htlc_pool(request: Request) -> asyncio.Queue:
+    """Get the pre-generated HTLC parameter pool created in the app lifespan"""
+    return request.app.state.htlc_pool
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional
 from enum import Enum
 
@@ -37,6 +37,10 @@ class ClaimFundsRequest(BaseModel):
     secret: Optional[str] = Field(None, description="Secret (only for initiator's first claim)")
 
 class SwapOfferResponse(BaseModel):
+    # Built straight from swap_offers rows; undeclared columns such as the
+    # secret are dropped rather than rejected
+    model_config = ConfigDict(extra="ignore")
+
     swap_id: str
     status: SwapStatus
     initiator_asset: str
@@ -1,18 +1,18 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-import uuid
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Any, Dict, List
+import asyncio
 import logging
 from .models import CreateSwapRequest, SwapResponse, BalanceResponse, RedeemSwapRequest
+from .dependencies import get_storage
 from htlc import HTLCEngine, SwapRecord, SwapStatus
 from db import SwapStorage
-from wallets import BitcoinWallet, DepixWallet
+from wallets import BitcoinWallet, DepixWallet, to_sats
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Global instances (in production, use dependency injection)
-storage = SwapStorage()
+# Global instances
 htlc_engine = HTLCEngine()
 
 # Wallet instances will be initialized in main.py
@@ -27,30 +27,27 @@ def set_wallets(btc_wallet: BitcoinWallet, dpx_wallet: DepixWallet):
 @router.get("/balances", response_model=BalanceResponse)
 async def get_balances():
     """Get current wallet balances"""
-    try:
+    depix_balance, btc_balance = await asyncio.gather(
+        depix_wallet.get_balance(),
+        bitcoin_wallet.get_balance(),
+        return_exceptions=True
+    )
+    
+    if isinstance(depix_balance, Exception):
+        logger.warning(f"Failed to get Depix balance: {depix_balance}")
         depix_balance = 0.0
+    
+    if isinstance(btc_balance, Exception):
+        logger.warning(f"Failed to get Bitcoin balance: {btc_balance}")
         btc_balance = 0.0
-        
-        try:
-            depix_balance = await depix_wallet.get_balance()
-        except Exception as e:
-            logger.warning(f"Failed to get Depix balance: {e}")
-        
-        try:
-            btc_balance = await bitcoin_wallet.get_balance()
-        except Exception as e:
-            logger.warning(f"Failed to get Bitcoin balance: {e}")
-        
-        return BalanceResponse(
-            depix_balance=depix_balance,
-            btc_balance=btc_balance
-        )
-    except Exception as e:
-        logger.error(f"Balance check error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    
+    return BalanceResponse(
+        depix_balance=depix_balance,
+        btc_balance=btc_balance
+    )
 
 @router.post("/swaps", response_model=SwapResponse)
-async def create_swap(request: CreateSwapRequest):
+async def create_swap(request: CreateSwapRequest, storage: SwapStorage = Depends(get_storage)):
     """Create new atomic swap"""
     try:
         # Generate HTLC parameters
@@ -59,7 +56,7 @@ async def create_swap(request: CreateSwapRequest):
         timelock = htlc_engine.create_timelock(hours=24)
         
         # Create swap record
-        swap_id = str(uuid.uuid4())
+        swap_id = htlc_engine.generate_swap_id()
         swap = SwapRecord(
             swap_id=swap_id,
             depix_amount=request.depix_amount,
@@ -69,34 +66,47 @@ async def create_swap(request: CreateSwapRequest):
             timelock=timelock
         )
         
-        # Lock Depix
-        depix_htlc = await depix_wallet.create_htlc(
-            request.depix_amount,
-            hashlock,
-            timelock,
-            request.depix_recipient
-        )
-        swap.depix_txid = depix_htlc["txid"]
-
-        try:
-            # Lock Bitcoin
-            btc_htlc = await bitcoin_wallet.create_htlc(
-                request.btc_amount,
+        # Lock Depix and Bitcoin concurrently; the hashlock makes ordering irrelevant
+        depix_htlc, btc_htlc = await asyncio.gather(
+            depix_wallet.create_htlc(
+                to_sats(request.depix_amount),
+                hashlock,
+                timelock,
+                request.depix_recipient
+            ),
+            bitcoin_wallet.create_htlc(
+                to_sats(request.btc_amount),
                 hashlock,
                 timelock,
                 request.btc_recipient
-            )
+            ),
+            return_exceptions=True
+        )
+        depix_failed = isinstance(depix_htlc, BaseException)
+        btc_failed = isinstance(btc_htlc, BaseException)
+        if not depix_failed:
+            swap.depix_txid = depix_htlc["txid"]
+        if not btc_failed:
             swap.btc_txid = btc_htlc["txid"]
-        except Exception as btc_err:
+
+        if depix_failed and btc_failed:
+            raise Exception(f"Depix and Bitcoin locks failed. depix_error={depix_htlc}. btc_error={btc_htlc}")
+        if depix_failed or btc_failed:
             # Persist partial state so operators can track and handle recovery/refund.
             swap.status = SwapStatus.FAILED
-            storage.save_swap(swap.to_dict())
-            raise Exception(f"Bitcoin lock failed after Depix lock. swap_id={swap_id}. error={btc_err}")
+            await asyncio.to_thread(storage.save_swap, swap.to_dict())
+            if btc_failed:
+                raise Exception(
+                    f"Bitcoin lock failed; Depix locked (txid={swap.depix_txid}). swap_id={swap_id}. error={btc_htlc}"
+                )
+            raise Exception(
+                f"Depix lock failed; Bitcoin locked (txid={swap.btc_txid}). swap_id={swap_id}. error={depix_htlc}"
+            )
         
         swap.status = SwapStatus.LOCKED
         
         # Save to database
-        storage.save_swap(swap.to_dict())
+        await asyncio.to_thread(storage.save_swap, swap.to_dict())
         
         return SwapResponse(**swap.to_dict())
     
@@ -104,24 +114,52 @@ async def create_swap(request: CreateSwapRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/swaps/{swap_id}", response_model=SwapResponse)
-async def get_swap(swap_id: str):
+async def get_swap(swap_id: str, storage: SwapStorage = Depends(get_storage)):
     """Get swap status"""
-    swap = storage.get_swap(swap_id)
+    swap = await asyncio.to_thread(storage.get_swap, swap_id)
     if not swap:
         raise HTTPException(status_code=404, detail="Swap not found")
     
     return SwapResponse(**swap)
 
 @router.get("/swaps", response_model=List[SwapResponse])
-async def list_swaps():
+async def list_swaps(storage: SwapStorage = Depends(get_storage)):
     """List all swaps"""
-    swaps = storage.get_all_swaps()
+    swaps = await asyncio.to_thread(storage.get_all_swaps)
     return [SwapResponse(**swap) for swap in swaps]
 
+async def _settle_both(storage: SwapStorage, swap: Dict[str, Any], action: str,
+                       done_status: SwapStatus, depix_call, btc_call):
+    """Run the Depix and Bitcoin settlement calls together and persist the outcome"""
+    depix_result, btc_result = await asyncio.gather(depix_call, btc_call, return_exceptions=True)
+    depix_failed = isinstance(depix_result, BaseException)
+    btc_failed = isinstance(btc_result, BaseException)
+    
+    if depix_failed and btc_failed:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Depix and Bitcoin {action} failed. depix_error={depix_result}. btc_error={btc_result}"
+        )
+    if depix_failed or btc_failed:
+        # One chain is settled; persist that so operators can finish the other side.
+        swap["status"] = SwapStatus.FAILED.value
+        await asyncio.to_thread(storage.save_swap, swap)
+        if btc_failed:
+            detail = (f"Bitcoin {action} failed; Depix {action} done (txid={depix_result.get('txid')}). "
+                      f"swap_id={swap['swap_id']}. error={btc_result}")
+        else:
+            detail = (f"Depix {action} failed; Bitcoin {action} done (txid={btc_result.get('txid')}). "
+                      f"swap_id={swap['swap_id']}. error={depix_result}")
+        logger.error(detail)
+        raise HTTPException(status_code=500, detail=detail)
+    
+    swap["status"] = done_status.value
+    await asyncio.to_thread(storage.save_swap, swap)
+
 @router.post("/swaps/{swap_id}/redeem")
-async def redeem_swap(swap_id: str, request: RedeemSwapRequest):
+async def redeem_swap(swap_id: str, request: RedeemSwapRequest, storage: SwapStorage = Depends(get_storage)):
     """Redeem swap with secret"""
-    swap = storage.get_swap(swap_id)
+    swap = await asyncio.to_thread(storage.get_swap, swap_id)
     if not swap:
         raise HTTPException(status_code=404, detail="Swap not found")
     
@@ -130,18 +168,18 @@ async def redeem_swap(swap_id: str, request: RedeemSwapRequest):
         raise HTTPException(status_code=400, detail="Invalid secret")
     
     # Redeem both HTLCs
-    await depix_wallet.redeem_htlc(swap["depix_txid"], request.secret)
-    await bitcoin_wallet.redeem_htlc(swap["btc_txid"], request.secret)
-    
-    swap["status"] = SwapStatus.COMPLETED.value
-    storage.save_swap(swap)
+    await _settle_both(
+        storage, swap, "redeem", SwapStatus.COMPLETED,
+        depix_wallet.redeem_htlc(swap["depix_txid"], request.secret),
+        bitcoin_wallet.redeem_htlc(swap["btc_txid"], request.secret)
+    )
     
     return {"status": "completed", "swap_id": swap_id}
 
 @router.post("/swaps/{swap_id}/refund")
-async def refund_swap(swap_id: str):
+async def refund_swap(swap_id: str, storage: SwapStorage = Depends(get_storage)):
     """Refund swap after timelock"""
-    swap = storage.get_swap(swap_id)
+    swap = await asyncio.to_thread(storage.get_swap, swap_id)
     if not swap:
         raise HTTPException(status_code=404, detail="Swap not found")
     
@@ -149,10 +187,10 @@ async def refund_swap(swap_id: str):
         raise HTTPException(status_code=400, detail="Timelock not expired")
     
     # Refund both HTLCs
-    await depix_wallet.refund_htlc(swap["depix_txid"])
-    await bitcoin_wallet.refund_htlc(swap["btc_txid"])
-    
-    swap["status"] = SwapStatus.REFUNDED.value
-    storage.save_swap(swap)
+    await _settle_both(
+        storage, swap, "refund", SwapStatus.REFUNDED,
+        depix_wallet.refund_htlc(swap["depix_txid"]),
+        bitcoin_wallet.refund_htlc(swap["btc_txid"])
+    )
     
     return {"status": "refunded", "swap_id": swap_id}
@@ -1,104 +1,160 @@
 import sqlite3
 import json
+import threading
+import time
 from typing import List, Optional, Dict, Any
-from contextlib import contextmanager
+
+# UPDATE ... RETURNING is available from SQLite 3.35
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Every swap_offers column except the secret
+_PUBLIC_OFFER_COLS = (
+    "swap_id, status, initiator_asset, initiator_amount, acceptor_asset, acceptor_amount, "
+    "initiator_address, acceptor_address, hashlock, initiator_timelock, acceptor_timelock, "
+    "initiator_txid, acceptor_txid, created_at, accepted_at, completed_at"
+)
+
+_SAVE_SWAP_SQL = """
+    INSERT OR REPLACE INTO swaps 
+    (swap_id, depix_amount, btc_amount, hashlock, timelock, status, depix_txid, btc_txid, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# How long cached offer reads are served before going back to SQLite
+_OFFER_CACHE_TTL = 1.0
+_OFFER_CACHE_MAX = 1024
 
 class SwapStorage:
     """SQLite storage for swap records"""
     
     def __init__(self, db_path: str = "swaps.db"):
         self.db_path = db_path
+        # One long-lived connection shared by all requests; statements are
+        # serialized through the lock since a connection is not reentrant.
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        # UPDATE templates keyed by the set of updated columns, so each
+        # statement shape is built once and hits sqlite's statement cache
+        self._update_cache: Dict[tuple, tuple] = {}
+        # Short-lived read caches for the hottest offer endpoints; populated
+        # and invalidated under the lock so a write is never shadowed
+        self._offer_cache: Dict[str, tuple] = {}
+        self._open_list_cache: Optional[tuple] = None
         self._init_db()
     
     def _init_db(self):
         """Initialize database schema"""
-        with self._get_connection() as conn:
-            # Legacy swaps table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS swaps (
-                    swap_id TEXT PRIMARY KEY,
-                    depix_amount REAL,
-                    btc_amount REAL,
-                    hashlock TEXT,
-                    timelock INTEGER,
-                    status TEXT,
-                    depix_txid TEXT,
-                    btc_txid TEXT,
-                    created_at INTEGER
+        with self._lock:
+            conn = self._conn
+            # Statements autocommit by default; group the schema into one transaction
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Legacy swaps table
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS swaps (
+                        swap_id TEXT PRIMARY KEY,
+                        depix_amount REAL,
+                        btc_amount REAL,
+                        hashlock TEXT,
+                        timelock INTEGER,
+                        status TEXT,
+                        depix_txid TEXT,
+                        btc_txid TEXT,
+                        created_at INTEGER
+                    )
+                """)
+                
+                # New atomic swap offers table
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS swap_offers (
+                        swap_id TEXT PRIMARY KEY,
+                        status TEXT NOT NULL,
+                        initiator_asset TEXT NOT NULL,
+                        initiator_amount REAL NOT NULL,
+                        acceptor_asset TEXT NOT NULL,
+                        acceptor_amount REAL NOT NULL,
+                        initiator_address TEXT NOT NULL,
+                        acceptor_address TEXT,
+                        hashlock TEXT NOT NULL,
+                        secret TEXT,
+                        initiator_timelock INTEGER NOT NULL,
+                        acceptor_timelock INTEGER NOT NULL,
+                        initiator_txid TEXT,
+                        acceptor_txid TEXT,
+                        created_at INTEGER NOT NULL,
+                        accepted_at INTEGER,
+                        completed_at INTEGER
+                    )
+                """)
+
+                # Status-filtered listings are ordered by creation time
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_swaps_status_created ON swaps(status, created_at DESC)"
                 )
-            """)
-            
-            # New atomic swap offers table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS swap_offers (
-                    swap_id TEXT PRIMARY KEY,
-                    status TEXT NOT NULL,
-                    initiator_asset TEXT NOT NULL,
-                    initiator_amount REAL NOT NULL,
-                    acceptor_asset TEXT NOT NULL,
-                    acceptor_amount REAL NOT NULL,
-                    initiator_address TEXT NOT NULL,
-                    acceptor_address TEXT,
-                    hashlock TEXT NOT NULL,
-                    secret TEXT,
-                    initiator_timelock INTEGER NOT NULL,
-                    acceptor_timelock INTEGER NOT NULL,
-                    initiator_txid TEXT,
-                    acceptor_txid TEXT,
-                    created_at INTEGER NOT NULL,
-                    accepted_at INTEGER,
-                    completed_at INTEGER
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_offers_status_created ON swap_offers(status, created_at DESC)"
                 )
-            """)
-            conn.commit()
-    
-    @contextmanager
-    def _get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        try:
-            yield conn
-        finally:
-            conn.close()
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self._lock:
+            self._conn.close()
     
     # Legacy swap methods
+    @staticmethod
+    def _swap_params(swap_data: Dict[str, Any]) -> tuple:
+        """Positional parameters for _SAVE_SWAP_SQL"""
+        return (
+            swap_data["swap_id"],
+            swap_data["depix_amount"],
+            swap_data["btc_amount"],
+            swap_data["hashlock"],
+            swap_data["timelock"],
+            swap_data["status"],
+            swap_data.get("depix_txid"),
+            swap_data.get("btc_txid"),
+            swap_data["created_at"]
+        )
+    
     def save_swap(self, swap_data: Dict[str, Any]):
         """Save or update swap record"""
-        with self._get_connection() as conn:
-            conn.execute("""
-                INSERT OR REPLACE INTO swaps 
-                (swap_id, depix_amount, btc_amount, hashlock, timelock, status, depix_txid, btc_txid, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                swap_data["swap_id"],
-                swap_data["depix_amount"],
-                swap_data["btc_amount"],
-                swap_data["hashlock"],
-                swap_data["timelock"],
-                swap_data["status"],
-                swap_data.get("depix_txid"),
-                swap_data.get("btc_txid"),
-                swap_data["created_at"]
-            ))
-            conn.commit()
+        with self._lock:
+            self._conn.execute(_SAVE_SWAP_SQL, self._swap_params(swap_data))
+    
+    def save_swaps_many(self, swaps: List[Dict[str, Any]]):
+        """Save or update several swap records in one transaction"""
+        params = [self._swap_params(swap_data) for swap_data in swaps]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(_SAVE_SWAP_SQL, params)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
     
     def get_swap(self, swap_id: str) -> Optional[Dict[str, Any]]:
         """Get swap by ID"""
-        with self._get_connection() as conn:
-            row = conn.execute("SELECT * FROM swaps WHERE swap_id = ?", (swap_id,)).fetchone()
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM swaps WHERE swap_id = ?", (swap_id,)).fetchone()
             return dict(row) if row else None
     
-    def get_all_swaps(self) -> List[Dict[str, Any]]:
-        """Get all swaps"""
-        with self._get_connection() as conn:
-            rows = conn.execute("SELECT * FROM swaps ORDER BY created_at DESC").fetchall()
-            return [dict(row) for row in rows]
+    def get_all_swaps(self) -> List[sqlite3.Row]:
+        """Get all swaps as read-only rows"""
+        with self._lock:
+            return self._conn.execute("SELECT * FROM swaps ORDER BY created_at DESC").fetchall()
     
     def get_pending_swaps(self) -> List[Dict[str, Any]]:
         """Get pending swaps"""
-        with self._get_connection() as conn:
-            rows = conn.execute(
+        with self._lock:
+            rows = self._conn.execute(
                 "SELECT * FROM swaps WHERE status IN ('pending', 'locked') ORDER BY created_at DESC"
             ).fetchall()
             return [dict(row) for row in rows]
@@ -106,8 +162,8 @@ class SwapStorage:
     # New atomic swap offer methods
     def create_offer(self, offer_data: Dict[str, Any]):
         """Create new swap offer"""
-        with self._get_connection() as conn:
-            conn.execute("""
+        with self._lock:
+            self._conn.execute("""
                 INSERT INTO swap_offers 
                 (swap_id, status, initiator_asset, initiator_amount, acceptor_asset, acceptor_amount,
                  initiator_address, hashlock, secret, initiator_timelock, acceptor_timelock, created_at)
@@ -126,43 +182,111 @@ class SwapStorage:
                 offer_data["acceptor_timelock"],
                 offer_data["created_at"]
             ))
-            conn.commit()
+            self._open_list_cache = None
     
+    def _cache_offer(self, swap_id: str, offer: Dict[str, Any]):
+        """Remember a public offer row; caller must hold the lock"""
+        if len(self._offer_cache) >= _OFFER_CACHE_MAX:
+            self._offer_cache.clear()
+        self._offer_cache[swap_id] = (time.monotonic(), offer)
+    
+    def _update_statement(self, updates: Dict[str, Any], returning: Optional[str] = None,
+                          match_status: bool = False) -> tuple:
+        """Get cached (sql, columns) UPDATE template for the given columns"""
+        key = (frozenset(updates), returning, match_status)
+        cached = self._update_cache.get(key)
+        if cached is None:
+            columns = tuple(updates)
+            set_clause = ", ".join([f"{k} = ?" for k in columns])
+            sql = f"UPDATE swap_offers SET {set_clause} WHERE swap_id = ?"
+            if match_status:
+                sql += " AND status = ?"
+            if returning:
+                sql += f" RETURNING {returning}"
+            cached = self._update_cache[key] = (sql, columns)
+        return cached
+
     def update_offer(self, swap_id: str, updates: Dict[str, Any]):
         """Update swap offer"""
-        with self._get_connection() as conn:
-            set_clause = ", ".join([f"{k} = ?" for k in updates.keys()])
-            values = list(updates.values()) + [swap_id]
-            conn.execute(f"UPDATE swap_offers SET {set_clause} WHERE swap_id = ?", values)
-            conn.commit()
-    
-    def get_offer(self, swap_id: str) -> Optional[Dict[str, Any]]:
-        """Get offer by ID"""
-        with self._get_connection() as conn:
-            row = conn.execute("SELECT * FROM swap_offers WHERE swap_id = ?", (swap_id,)).fetchone()
+        sql, columns = self._update_statement(updates)
+        values = [updates[k] for k in columns] + [swap_id]
+        with self._lock:
+            self._conn.execute(sql, values)
+            self._offer_cache.pop(swap_id, None)
+            self._open_list_cache = None
+
+    def transition(self, swap_id: str, expected_from: str, updates: Dict[str, Any],
+                   with_secret: bool = False) -> Optional[Dict[str, Any]]:
+        """Apply updates only if the offer is still in the expected_from status.
+
+        Returns the updated row (including the secret only when with_secret is
+        set), or None if the offer does not exist or is in another status.
+        """
+        returned_cols = "*" if with_secret else _PUBLIC_OFFER_COLS
+        sql, columns = self._update_statement(
+            updates, returning=returned_cols if _HAS_RETURNING else None, match_status=True
+        )
+        values = [updates[k] for k in columns] + [swap_id, expected_from]
+        with self._lock:
+            cursor = self._conn.execute(sql, values)
+            if _HAS_RETURNING:
+                row = cursor.fetchone()
+            elif cursor.rowcount:
+                row = self._conn.execute(
+                    f"SELECT {returned_cols} FROM swap_offers WHERE swap_id = ?", (swap_id,)
+                ).fetchone()
+            else:
+                row = None
+            self._offer_cache.pop(swap_id, None)
+            self._open_list_cache = None
             return dict(row) if row else None
+
+    def get_offer_public(self, swap_id: str) -> Optional[Dict[str, Any]]:
+        """Get offer by ID (without secret); served from cache for up to a second"""
+        cached = self._offer_cache.get(swap_id)
+        if cached and time.monotonic() - cached[0] < _OFFER_CACHE_TTL:
+            return cached[1]
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_PUBLIC_OFFER_COLS} FROM swap_offers WHERE swap_id = ?", (swap_id,)
+            ).fetchone()
+            if not row:
+                return None
+            offer = dict(row)
+            self._cache_offer(swap_id, offer)
+            return offer
     
-    def get_all_offers(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Get all offers, optionally filtered by status"""
-        with self._get_connection() as conn:
-            if status:
-                rows = conn.execute(
-                    "SELECT * FROM swap_offers WHERE status = ? ORDER BY created_at DESC",
-                    (status,)
-                ).fetchall()
-            else:
-                rows = conn.execute("SELECT * FROM swap_offers ORDER BY created_at DESC").fetchall()
-            return [dict(row) for row in rows]
+    def _select_offers_public(self, status: Optional[str] = None) -> List[sqlite3.Row]:
+        """Select offers without secrets; caller must hold the lock"""
+        if status:
+            return self._conn.execute(
+                f"SELECT {_PUBLIC_OFFER_COLS} FROM swap_offers WHERE status = ? ORDER BY created_at DESC",
+                (status,)
+            ).fetchall()
+        return self._conn.execute(
+            f"SELECT {_PUBLIC_OFFER_COLS} FROM swap_offers ORDER BY created_at DESC"
+        ).fetchall()
+    
+    def get_all_offers_public(self, status: Optional[str] = None) -> List[sqlite3.Row]:
+        """Get all offers (without secrets) as read-only rows, optionally filtered by status"""
+        with self._lock:
+            return self._select_offers_public(status)
     
-    def get_open_offers(self) -> List[Dict[str, Any]]:
-        """Get offers that can be accepted"""
-        return self.get_all_offers(status="offered")
+    def get_open_offers(self) -> List[sqlite3.Row]:
+        """Get offers that can be accepted; served from cache for up to a second"""
+        cached = self._open_list_cache
+        if cached and time.monotonic() - cached[0] < _OFFER_CACHE_TTL:
+            return cached[1]
+        with self._lock:
+            rows = self._select_offers_public(status="offered")
+            self._open_list_cache = (time.monotonic(), rows)
+            return rows
     
     def get_active_offers(self) -> List[Dict[str, Any]]:
         """Get offers in progress"""
-        with self._get_connection() as conn:
-            rows = conn.execute("""
-                SELECT * FROM swap_offers 
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT {_PUBLIC_OFFER_COLS} FROM swap_offers 
                 WHERE status IN ('accepted', 'initiator_locked', 'acceptor_locked', 'initiator_claimed')
                 ORDER BY created_at DESC
             """).fetchall()
@@ -1,9 +1,15 @@
+import functools
 import hashlib
+import hmac
 import os
 import time
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union
 from enum import Enum
 
+# Entropy is drawn from os.urandom in bulk and sliced per swap ID
+_ID_POOL_SIZE = 4096
+_id_pool = bytearray()
+
 class SwapStatus(Enum):
     PENDING = "pending"
     LOCKED = "locked"
@@ -19,25 +25,54 @@ class HTLCEngine:
         """Generate random 32-byte secret"""
         return os.urandom(32)
     
+    @staticmethod
+    def generate_swap_id() -> str:
+        """Generate random UUID4-formatted swap ID"""
+        global _id_pool
+        if not _id_pool:
+            _id_pool = bytearray(os.urandom(_ID_POOL_SIZE))
+        raw = _id_pool[-16:]
+        del _id_pool[-16:]
+        raw[6] = (raw[6] & 0x0F) | 0x40  # version 4
+        raw[8] = (raw[8] & 0x3F) | 0x80  # RFC 4122 variant
+        h = raw.hex()
+        return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+    
+    @staticmethod
+    def create_hashlock_bytes(secret: bytes) -> bytes:
+        """Create raw SHA256 hashlock digest from secret"""
+        return hashlib.sha256(secret).digest()
+    
     @staticmethod
     def create_hashlock(secret: bytes) -> str:
         """Create SHA256 hashlock from secret"""
-        return hashlib.sha256(secret).hexdigest()
+        return HTLCEngine.create_hashlock_bytes(secret).hex()
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def verify_secret(secret: bytes, hashlock: Union[str, bytes]) -> bool:
+        """Verify secret matches hashlock (hex or raw digest; cached for redeem retries)"""
+        if isinstance(hashlock, str):
+            try:
+                hashlock = bytes.fromhex(hashlock)
+            except ValueError:
+                return False
+        return hmac.compare_digest(HTLCEngine.create_hashlock_bytes(secret), hashlock)
     
     @staticmethod
-    def verify_secret(secret: bytes, hashlock: str) -> bool:
-        """Verify secret matches hashlock"""
-        return hashlib.sha256(secret).hexdigest() == hashlock
+    def now() -> int:
+        """Current Unix time in whole seconds (integer clock, no float round-trip)"""
+        return time.time_ns() // 1_000_000_000
     
     @staticmethod
     def create_timelock(hours: int = 24) -> int:
         """Create timelock (Unix timestamp)"""
-        return int(time.time()) + (hours * 3600)
+        return HTLCEngine.now() + (hours * 3600)
     
     @staticmethod
     def is_timelock_expired(timelock: int) -> bool:
         """Check if timelock has expired"""
-        return int(time.time()) > timelock
+        return HTLCEngine.now() > timelock
 
 class SwapRecord:
     """Record of an atomic swap"""
@@ -60,7 +95,7 @@ class SwapRecord:
         self.status = SwapStatus.PENDING
         self.depix_txid: Optional[str] = None
         self.btc_txid: Optional[str] = None
-        self.created_at = int(time.time())
+        self.created_at = HTLCEngine.now()
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary"""
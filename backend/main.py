@@ -1,6 +1,10 @@
+import asyncio
+import hashlib
 import os
+import ssl
 import sys
 import logging
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
 
 # Add backend directory to Python path
@@ -8,9 +12,13 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
 from api import router, set_wallets
-from api.atomic_routes import router as atomic_router, set_wallets as set_atomic_wallets
+from api.atomic_routes import (
+    router as atomic_router, set_wallets as set_atomic_wallets, refill_htlc_pool, HTLC_POOL_SIZE
+)
+from db import SwapStorage
 from wallets import BitcoinWallet, DepixWallet
 
 # Configure logging
@@ -20,18 +28,64 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-project_root = Path(__file__).resolve().parent.parent
-load_dotenv(project_root / ".env")
-load_dotenv()
+# Load environment variables from the project root; real env vars take precedence
+load_dotenv(Path(__file__).resolve().parents[1] / ".env", override=False)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Single storage (and SQLite connection) shared by all routers
+    app.state.storage = SwapStorage()
+    # Created here so the queue belongs to the loop serving this lifespan
+    app.state.htlc_pool = asyncio.Queue(maxsize=HTLC_POOL_SIZE)
+    htlc_pool_task = asyncio.create_task(refill_htlc_pool(app.state.htlc_pool))
+    yield
+    htlc_pool_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await htlc_pool_task
+    await depix_wallet.aclose()
+    await bitcoin_wallet.aclose()
+    app.state.storage.close()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Depix ↔ Bitcoin Atomic Swap API",
     description="PoC for atomic swaps between Depix and Bitcoin with two-party coordination",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+class UnhandledExceptionMiddleware:
+    """Turn uncaught route errors into JSON 500s (plain ASGI, no per-request task group)"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        response_started = False
+        
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as exc:
+            logger.exception("Unhandled error on %s", scope["path"])
+            if response_started:
+                raise
+            response = ORJSONResponse(status_code=500, content={"detail": str(exc)})
+            await response(scope, receive, send)
+
+# Catch-all for routes without their own error handling (e.g. plain reads).
+# Added before CORSMiddleware so it runs inside it and the 500s keep CORS headers.
+app.add_middleware(UnhandledExceptionMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -44,6 +98,11 @@ app.add_middleware(
 # Initialize wallets
 electrum_password = os.getenv("ELECTRUM_PASSWORD")
 logger.info("ELECTRUM_PASSWORD loaded: %s", "yes" if electrum_password else "no")
+# HTLC hashing goes through hashlib's OpenSSL backend
+logger.info(
+    "hashlib backend: %s; algorithms available: %s",
+    ssl.OPENSSL_VERSION, ", ".join(sorted(hashlib.algorithms_available))
+)
 
 bitcoin_wallet = BitcoinWallet(
     wallet_path=os.getenv("ELECTRUM_WALLET_PATH"),
@@ -88,5 +147,8 @@ if __name__ == "__main__":
     uvicorn.run(
         app,
         host=os.getenv("API_HOST", "0.0.0.0"),
-        port=int(os.getenv("API_PORT", "8001"))
+        port=int(os.getenv("API_PORT", "8001")),
+        # uvloop has no Windows build; fall back to the stdlib loop there
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools"
     )
@@ -1,5 +1,5 @@
-from .base import WalletInterface
+from .base import WalletInterface, to_sats
 from .bitcoin import BitcoinWallet
 from .depix import DepixWallet
 
-__all__ = ["WalletInterface", "BitcoinWallet", "DepixWallet"]
+__all__ = ["WalletInterface", "BitcoinWallet", "DepixWallet", "to_sats"]
@@ -1,8 +1,21 @@
 from abc import ABC, abstractmethod
 from typing import Dict, Any
 
+SATS_PER_COIN = 100_000_000
+
+def to_sats(amount: float) -> int:
+    """Convert a coin amount to integer satoshis"""
+    return round(amount * SATS_PER_COIN)
+
 class WalletInterface(ABC):
-    """Base interface for wallet implementations"""
+    """Base interface for wallet implementations
+
+    Implementations are shared by all requests and must be safe for
+    concurrent use on one event loop, so handlers can fan out calls to
+    both chains with asyncio.gather. Configuration is read-only after
+    __init__; any mutable state (caches, pooled clients) must tolerate
+    interleaved awaits.
+    """
     
     @abstractmethod
     async def get_balance(self) -> float:
@@ -10,8 +23,8 @@ class WalletInterface(ABC):
         pass
     
     @abstractmethod
-    async def create_htlc(self, amount: float, hashlock: str, timelock: int, recipient: str) -> Dict[str, Any]:
-        """Create HTLC transaction"""
+    async def create_htlc(self, amount_sats: int, hashlock: str, timelock: int, recipient: str) -> Dict[str, Any]:
+        """Create HTLC transaction for amount_sats (1e-8 units of the asset)"""
         pass
     
     @abstractmethod
@@ -1,14 +1,33 @@
 import asyncio
-import json
+import httpx
+import itertools
 import logging
+import orjson
 import os
-from typing import Dict, Any
-from .base import WalletInterface
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from .base import WalletInterface, SATS_PER_COIN
 
 logger = logging.getLogger(__name__)
 
+# Names of the positional CLI arguments, used to build named JSON-RPC params
+_RPC_ARG_NAMES = {
+    "payto": ("destination", "amount"),
+    "broadcast": ("tx",),
+    "get_tx_status": ("txid",),
+}
+
+# Transactions this deep are treated as final and their status is cached
+_TX_CACHE_MIN_CONF = 7
+_TX_CACHE_MAX = 10_000
+
+# Limits for a single Electrum CLI invocation
+_CLI_TIMEOUT = 30.0
+_MAX_STDOUT = 4 * 1024 * 1024
+
 class BitcoinWallet(WalletInterface):
-    """Bitcoin wallet via Electrum CLI"""
+    """Bitcoin wallet via the Electrum daemon RPC, or the Electrum CLI"""
     
     def __init__(self, wallet_path: str, testnet: bool = True, wallet_password: str | None = None):
         if not wallet_path:
@@ -22,6 +41,29 @@ class BitcoinWallet(WalletInterface):
             "ELECTRUM_BIN",
             "/home/dev/Downloads/electrum-4.7.0-x86_64.AppImage",
         )
+        # Static CLI arguments placed around each command and its arguments
+        self._cmd_prefix = (self.electrum_bin, "-w", self.wallet_path)
+        self._cmd_suffix = (("--testnet",) if testnet else ()) + (f"--dir={self.electrum_dir}",)
+        # (fetched_at, balance) from the last getbalance, reused for _bal_ttl seconds
+        self._bal_cache: Optional[Tuple[float, float]] = None
+        self._bal_ttl = float(os.getenv("BALANCE_CACHE_TTL_SEC", "3"))
+        # A running `electrum daemon` avoids starting the AppImage per command
+        self.electrum_rpc_url = os.getenv("ELECTRUM_RPC_URL", "")
+        self._rpc_auth = (os.getenv("ELECTRUM_RPC_USER", ""), os.getenv("ELECTRUM_RPC_PASSWORD", ""))
+        self._rpc_client = httpx.AsyncClient(
+            timeout=30.0,
+            headers={"Content-Type": "application/json"},
+        ) if self.electrum_rpc_url else None
+        self._request_ids = itertools.count(1)
+        # Each CLI command is a full AppImage process, so keep only a few in flight
+        self._sem = asyncio.Semaphore(int(os.getenv("ELECTRUM_CONCURRENCY", "4")))
+        # LRU of txid -> status for deeply confirmed (immutable) transactions
+        self._tx_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    async def aclose(self):
+        """Close pooled daemon RPC connections"""
+        if self._rpc_client is not None:
+            await self._rpc_client.aclose()
 
     @staticmethod
     def _extract_hex(payload: Any, source: str) -> str:
@@ -35,12 +77,60 @@ class BitcoinWallet(WalletInterface):
                 return payload["tx"]
         raise Exception(f"Unexpected {source} response format: {payload}")
     
-    async def _electrum_cmd(self, command: str, *args) -> Any:
+    async def _electrum_cmd(self, command: str, *args, **options) -> Any:
+        """Execute Electrum command via the daemon RPC, falling back to the CLI
+
+        options are Electrum command options: True renders as a bare --flag
+        on the CLI, other values as --name value.
+        """
+        # Positional args the RPC cannot name (see _RPC_ARG_NAMES) go through the CLI
+        use_rpc = self._rpc_client is not None and len(args) <= len(_RPC_ARG_NAMES.get(command, ()))
+        async with self._sem:
+            if use_rpc:
+                try:
+                    return await self._electrum_rpc(command, *args, **options)
+                except httpx.ConnectError:
+                    logger.warning("Electrum daemon not reachable at %s, using CLI", self.electrum_rpc_url)
+            return await self._electrum_cli(command, *args, **options)
+    
+    async def _electrum_rpc(self, command: str, *args, **options) -> Any:
+        """Execute Electrum command through the daemon's JSON-RPC interface"""
+        arg_names = _RPC_ARG_NAMES.get(command, ())
+        if len(args) > len(arg_names):
+            raise ValueError(f"No JSON-RPC parameter names for {len(args)} argument(s) of Electrum command {command}")
+        params = dict(zip(arg_names, args))
+        params.update(options)
+        params["wallet"] = self.wallet_path
+        payload = {
+            "jsonrpc": "2.0",
+            "id": next(self._request_ids),
+            "method": command,
+            "params": params
+        }
+        response = await self._rpc_client.post(
+            self.electrum_rpc_url, content=orjson.dumps(payload), auth=self._rpc_auth
+        )
+        if response.is_error and not response.headers.get("content-type", "").startswith("application/json"):
+            # e.g. 401 from wrong ELECTRUM_RPC_USER / ELECTRUM_RPC_PASSWORD, with a non-JSON body
+            logger.error("Electrum RPC HTTP %s", response.status_code)
+            raise Exception(f"Electrum RPC HTTP {response.status_code}")
+        result = orjson.loads(response.content)
+        
+        error = result.get("error")
+        if error:
+            error_msg = error.get("message", error) if isinstance(error, dict) else error
+            logger.error("Electrum error: %s", error_msg)
+            raise Exception(f"Electrum error: {error_msg}")
+        return result.get("result")
+    
+    async def _electrum_cli(self, command: str, *args, **options) -> Any:
         """Execute Electrum CLI command"""
-        cmd = [self.electrum_bin, "-w", self.wallet_path, command, *[str(a) for a in args]]
-        if self.testnet:
-            cmd.append("--testnet")
-        cmd.append(f"--dir={self.electrum_dir}")
+        cmd = [*self._cmd_prefix, command, *map(str, args)]
+        for name, value in options.items():
+            cmd.append(f"--{name}")
+            if value is not True:
+                cmd.append(str(value))
+        cmd += self._cmd_suffix
         
         try:
             process = await asyncio.create_subprocess_exec(
@@ -49,67 +139,92 @@ class BitcoinWallet(WalletInterface):
                 stderr=asyncio.subprocess.PIPE
             )
             
-            stdout, stderr = await process.communicate()
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=_CLI_TIMEOUT)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise Exception(f"Electrum command {command} timed out after {_CLI_TIMEOUT:g}s")
+            if len(stdout) > _MAX_STDOUT:
+                raise Exception(f"Electrum command {command} output exceeds {_MAX_STDOUT} bytes")
             
-            if process.returncode != 0:
-                stderr_text = stderr.decode().strip() if stderr else ""
-                stdout_text = stdout.decode().strip() if stdout else ""
-                error_msg = stderr_text or stdout_text or "Unknown error"
-                logger.error(f"Electrum error: {error_msg}")
+            if process.returncode:
+                # Pick the message at the bytes level and decode only that one
+                error_msg = (stderr.strip() or stdout.strip() or b"Unknown error").decode(errors="replace")
+                logger.error("Electrum error: %s", error_msg)
                 raise Exception(f"Electrum error: {error_msg}")
             
-            result = stdout.decode().strip()
-            if not result:
+            data = stdout.strip()
+            if not data:
                 return None
-            try:
-                return json.loads(result)
-            except json.JSONDecodeError:
-                # Many Electrum CLI commands return plain text (e.g. tx hex, addresses, txid).
-                return result
+            if data[:1] in (b"{", b"["):
+                return orjson.loads(data)
+            # Many Electrum CLI commands return plain text (e.g. tx hex, addresses, txid).
+            return data.decode()
         except FileNotFoundError:
             logger.error("Electrum AppImage not found")
             raise Exception("Electrum not installed")
         except Exception as e:
-            logger.error(f"Electrum command error: {e}")
+            logger.error("Electrum command error: %s", e)
             raise
     
+    def invalidate_balance(self):
+        """Drop the cached balance so the next read hits Electrum"""
+        self._bal_cache = None
+    
     async def get_balance(self) -> float:
-        """Get Bitcoin balance"""
+        """Get Bitcoin balance (cached for BALANCE_CACHE_TTL_SEC)"""
+        if self._bal_cache and time.monotonic() - self._bal_cache[0] < self._bal_ttl:
+            return self._bal_cache[1]
         balance = await self._electrum_cmd("getbalance")
-        return float(balance.get("confirmed", 0))
+        confirmed = float(balance.get("confirmed", 0))
+        self._bal_cache = (time.monotonic(), confirmed)
+        return confirmed
+    
+    async def get_confirmed_tx(self, txid: str) -> Dict[str, Any]:
+        """Get transaction status, cached once it has _TX_CACHE_MIN_CONF confirmations"""
+        cached = self._tx_cache.get(txid)
+        if cached is not None:
+            self._tx_cache.move_to_end(txid)
+            return cached
+        
+        status = await self._electrum_cmd("get_tx_status", txid)
+        if isinstance(status, dict) and int(status.get("confirmations", 0)) >= _TX_CACHE_MIN_CONF:
+            self._tx_cache[txid] = status
+            if len(self._tx_cache) > _TX_CACHE_MAX:
+                self._tx_cache.popitem(last=False)
+        return status
     
-    async def create_htlc(self, amount: float, hashlock: str, timelock: int, recipient: str) -> Dict[str, Any]:
+    async def create_htlc(self, amount_sats: int, hashlock: str, timelock: int, recipient: str) -> Dict[str, Any]:
         """Create HTLC on Bitcoin testnet"""
+        if not isinstance(amount_sats, int):
+            raise TypeError(f"amount_sats must be an int, got {type(amount_sats).__name__}")
         try:
             # For PoC, use simple payto instead of complex HTLC script
             # In production, this would create proper Bitcoin HTLC with OP_SHA256, OP_EQUAL, etc.
             
-            # Build unsigned tx first. Encrypted wallets can still require password here.
-            payto_args = [recipient, str(amount), "--unsigned"]
-            if self.wallet_password:
-                payto_args.extend(["--password", self.wallet_password])
-            unsigned_tx = await self._electrum_cmd("payto", *payto_args)
-            unsigned_tx_hex = self._extract_hex(unsigned_tx, "payto")
+            password = {"password": self.wallet_password} if self.wallet_password else {}
             
-            # Sign transaction; include password when configured for encrypted wallets.
-            sign_args = [unsigned_tx_hex]
-            if self.wallet_password:
-                sign_args.extend(["--password", self.wallet_password])
-            signed_tx = await self._electrum_cmd("signtransaction", *sign_args)
-            signed_tx_hex = self._extract_hex(signed_tx, "signtransaction")
+            # payto signs the tx itself (password needed for encrypted wallets),
+            # saving a separate signtransaction round-trip before broadcast.
+            # Exact 8-decimal BTC string, so Electrum never sees float noise
+            amount = format(amount_sats / SATS_PER_COIN, ".8f")
+            signed_tx = await self._electrum_cmd("payto", recipient, amount, **password)
+            signed_tx_hex = self._extract_hex(signed_tx, "payto")
             txid = await self._electrum_cmd("broadcast", signed_tx_hex)
             txid_str = txid if isinstance(txid, str) else str(txid)
+            self.invalidate_balance()
             
-            logger.info(f"Created HTLC transaction: {txid_str}")
+            logger.info("Created HTLC transaction: %s", txid_str)
             
             return {
                 "txid": txid_str,
-                "amount": amount,
+                "amount_sats": amount_sats,
                 "hashlock": hashlock,
                 "timelock": timelock
             }
         except Exception as e:
-            logger.error(f"Failed to create HTLC: {e}")
+            logger.error("Failed to create HTLC: %s", e)
             if "Password required" in str(e) and not self.wallet_password:
                 raise Exception(
                     "Bitcoin HTLC creation failed: Electrum wallet is encrypted. "
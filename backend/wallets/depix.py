@@ -1,9 +1,13 @@
+import asyncio
 import httpx
-import json
+import itertools
 import logging
+import orjson
 import os
-from typing import Dict, Any
-from .base import WalletInterface
+import time
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Tuple
+from .base import WalletInterface, SATS_PER_COIN
 
 logger = logging.getLogger(__name__)
 
@@ -16,55 +20,137 @@ class DepixWallet(WalletInterface):
         self.timeout = 10.0
         self.wallet_name = os.getenv("ELEMENTD_WALLET", "depixswap")
         self.depix_asset_id = os.getenv("DEPIX_ASSET_ID", "")
+        # Long-lived client so RPC calls reuse keep-alive connections to elementd
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            headers={"Content-Type": "application/json"},
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+        # Concurrent calls arriving within batch_window are sent as one JSON-RPC batch
+        self.batch_window = 0.002
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._request_ids = itertools.count(1)
+        # Caps in-flight HTTP requests so bursts don't exhaust elementd's rpcworkqueue
+        self._sem = asyncio.Semaphore(int(os.getenv("DEPIX_RPC_CONCURRENCY", "16")))
+        # (fetched_at, balance) from the last getbalance, reused for _bal_ttl seconds
+        self._bal_cache: Optional[Tuple[float, float]] = None
+        self._bal_ttl = float(os.getenv("BALANCE_CACHE_TTL_SEC", "3"))
     
-    async def _rpc_call(self, method: str, params: list = None) -> Any:
-        """Make RPC call to elementd"""
+    async def aclose(self):
+        """Close pooled RPC connections"""
+        await self._client.aclose()
+    
+    async def _post(self, body: Any) -> Any:
+        """POST a JSON-RPC request (or batch of requests) to elementd"""
         # Use wallet endpoint if wallet is loaded
         url = f"{self.rpc_url}/wallet/{self.wallet_name}" if self.wallet_name else self.rpc_url
+        try:
+            async with self._sem:
+                # orjson emits bytes directly (booleans serialize as JSON true/false)
+                response = await self._client.post(url, content=orjson.dumps(body), auth=self.auth)
+            return orjson.loads(response.content)
+        except httpx.ConnectError:
+            logger.error("Cannot connect to elementd at %s", self.rpc_url)
+            raise Exception(f"Elementd not running or not accessible at {self.rpc_url}")
+    
+    @staticmethod
+    def _unwrap(result: Dict[str, Any]) -> Any:
+        """Extract the result of a single JSON-RPC response"""
+        if "error" in result and result["error"]:
+            raise Exception(f"RPC Error: {result['error']}")
+        return result.get("result")
+    
+    async def _flush(self):
+        """Send all pending calls in one request and resolve their futures"""
+        await asyncio.sleep(self.batch_window)
+        pending, self._pending = self._pending, []
+        self._flush_task = None
+        
+        try:
+            if len(pending) == 1:
+                replies = [await self._post(pending[0][0])]
+            else:
+                replies = await self._post([payload for payload, _ in pending])
+                if not isinstance(replies, list):
+                    raise Exception(f"RPC Error: {replies.get('error') if isinstance(replies, dict) else replies}")
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
         
+        replies_by_id = {reply.get("id"): reply for reply in replies}
+        for payload, future in pending:
+            if future.done():
+                continue
+            reply = replies_by_id.get(payload["id"])
+            if reply is None:
+                future.set_exception(Exception(f"RPC Error: no response to {payload['method']}"))
+                continue
+            try:
+                future.set_result(self._unwrap(reply))
+            except Exception as e:
+                future.set_exception(e)
+    
+    async def _rpc_call(self, method: str, params: list = None, batch: bool = True) -> Any:
+        """Make RPC call to elementd
+
+        Calls are coalesced with other concurrent calls into a JSON-RPC batch
+        unless batch is False, which posts the request on its own right away.
+        """
         payload = {
             "jsonrpc": "2.0",
-            "id": "depix-swap",
+            "id": next(self._request_ids),
             "method": method,
             "params": params or []
         }
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                # Ensure proper JSON serialization of booleans
-                response = await client.post(
-                    url, 
-                    json=payload, 
-                    auth=self.auth,
-                    headers={"Content-Type": "application/json"}
-                )
-                result = response.json()
-                
-                if "error" in result and result["error"]:
-                    raise Exception(f"RPC Error: {result['error']}")
-                
-                return result.get("result")
-        except httpx.ConnectError:
-            logger.error(f"Cannot connect to elementd at {self.rpc_url}")
-            raise Exception(f"Elementd not running or not accessible at {self.rpc_url}")
+            if not batch:
+                return self._unwrap(await self._post(payload))
+            
+            future = asyncio.get_running_loop().create_future()
+            self._pending.append((payload, future))
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush())
+            return await future
         except Exception as e:
-            logger.error(f"Elementd RPC error: {e}")
+            logger.error("Elementd RPC error: %s", e)
             raise
     
+    def invalidate_balance(self):
+        """Drop the cached balance so the next read hits elementd"""
+        self._bal_cache = None
+    
     async def get_balance(self) -> float:
-        """Get Depix balance"""
-        balance_dict = await self._rpc_call("getbalance")
+        """Get Depix balance (cached for BALANCE_CACHE_TTL_SEC)"""
+        if self._bal_cache and time.monotonic() - self._bal_cache[0] < self._bal_ttl:
+            return self._bal_cache[1]
+        balance = await self._fetch_balance()
+        self._bal_cache = (time.monotonic(), balance)
+        return balance
+    
+    async def _fetch_balance(self) -> float:
+        """Query Depix balance from elementd"""
+        if self.depix_asset_id:
+            # dummy, minconf, include_watchonly, avoid_reuse, assetlabel:
+            # elementd returns just the requested asset's amount
+            balance = await self._rpc_call(
+                "getbalance", ["*", 0, False, False, self.depix_asset_id], batch=False
+            )
+            if isinstance(balance, dict):
+                return float(balance.get(self.depix_asset_id, 0))
+            return float(balance)
+        
+        balance_dict = await self._rpc_call("getbalance", batch=False)
         
         # Elements returns balance as dict with asset IDs as keys
         if isinstance(balance_dict, dict):
-            # Try to get Depix asset balance
-            if self.depix_asset_id and self.depix_asset_id in balance_dict:
-                return float(balance_dict[self.depix_asset_id])
-            
-            # If no specific asset ID, return first non-bitcoin asset
+            # No specific asset ID, return first non-bitcoin asset
             for asset_id, amount in balance_dict.items():
                 if asset_id != "bitcoin" and float(amount) > 0:
-                    logger.info(f"Using asset {asset_id} with balance {amount}")
+                    logger.info("Using asset %s with balance %s", asset_id, amount)
                     return float(amount)
             
             # Fallback to bitcoin balance
@@ -73,12 +159,17 @@ class DepixWallet(WalletInterface):
         # Fallback for simple numeric response
         return float(balance_dict)
     
-    async def create_htlc(self, amount: float, hashlock: str, timelock: int, recipient: str) -> Dict[str, Any]:
+    async def create_htlc(self, amount_sats: int, hashlock: str, timelock: int, recipient: str) -> Dict[str, Any]:
         """Create HTLC on Liquid Network"""
+        if not isinstance(amount_sats, int):
+            raise TypeError(f"amount_sats must be an int, got {type(amount_sats).__name__}")
         try:
             # For PoC, use simple sendtoaddress instead of complex HTLC script
             # In production, this would create proper HTLC with OP_SHA256, OP_EQUAL, etc.
             
+            # elementd accepts amounts as strings; this one is exact to 8 decimals
+            amount = format(Decimal(amount_sats) / SATS_PER_COIN, "f")
+            
             # Use minimal parameters to avoid type issues
             if self.depix_asset_id:
                 # Only pass required params and assetlabel
@@ -96,18 +187,19 @@ class DepixWallet(WalletInterface):
                 ])
             else:
                 txid = await self._rpc_call("sendtoaddress", [recipient, amount])
+            self.invalidate_balance()
             
-            logger.info(f"Created HTLC transaction: {txid}")
+            logger.info("Created HTLC transaction: %s", txid)
             
             return {
                 "txid": txid,
-                "amount": amount,
+                "amount_sats": amount_sats,
                 "hashlock": hashlock,
                 "timelock": timelock
             }
         except Exception as e:
             error_msg = str(e)
-            logger.error(f"Failed to create HTLC: {error_msg}")
+            logger.error("Failed to create HTLC: %s", error_msg)
             raise Exception(f"Depix HTLC creation failed: {error_msg}")
     
     async def redeem_htlc(self, txid: str, secret: str) -> Dict[str, Any]: